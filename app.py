@@ -7,18 +7,34 @@ from dotenv import load_dotenv
 from summarizer import ArticleSummarizer
 from image_generator import InfographicGenerator
 from storage import StorageManager
+from llm_cache import get_default_cache
+from http_client import configure_logging
 
 # Load environment variables
 load_dotenv()
 
-# Initialize components
-summarizer = ArticleSummarizer()
-image_generator = InfographicGenerator()
-storage_manager = StorageManager()
+configure_logging()
 
-# Set up the Streamlit page
+# Set up the Streamlit page first, the cached components below may show a spinner
 st.set_page_config(page_title="AiNewsHelper", layout="wide")
 
+# Initialize components once per process so their pooled HTTP sessions survive reruns
+@st.cache_resource
+def get_summarizer():
+    return ArticleSummarizer()
+
+@st.cache_resource
+def get_image_generator():
+    return InfographicGenerator()
+
+@st.cache_resource
+def get_storage_manager():
+    return StorageManager()
+
+summarizer = get_summarizer()
+image_generator = get_image_generator()
+storage_manager = get_storage_manager()
+
 # App title and description
 st.title("AiNewsHelper")
 st.markdown(
@@ -122,4 +138,8 @@ with st.sidebar:
         """- BytePlus text-to-image Vision model to generate contextual images based on article"""
     )
     st.markdown(
-        """- BytePlus Cloud Object Storage to store and download generated images and summaries""")
\ No newline at end of file
+        """- BytePlus Cloud Object Storage to store and download generated images and summaries""")
+    
+    st.header("Response Cache")
+    response_cache = get_default_cache()
+    st.markdown(f"Hits: {response_cache.hits} | Misses: {response_cache.misses}")
\ No newline at end of file
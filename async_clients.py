@@ -0,0 +1,157 @@
+"""Asyncio session and event loop for concurrent fan-out of BytePlus API calls.
+
+The generators' asynchronous methods take the session from here, so webstories
+are generated over one pooled aiohttp session.
+"""
+
+import asyncio
+import threading
+import aiohttp
+from aiohttp_retry import ExponentialRetry, RetryClient
+
+from http_client import REQUEST_TIMEOUT, RETRY_STATUSES
+
+# Image generations in flight at once, to stay within the provider's rate limits
+MAX_CONCURRENT_IMAGES = 5
+
+def create_client_session():
+    """Create an aiohttp session whose connector reuses TLS connections.
+
+    Throttled and transient server error responses and failed connection
+    attempts are retried up to 3 attempts with exponential backoff. Timeouts
+    and errors after the request was sent are not, since repeating an image
+    POST would bill another generation.
+
+    Returns:
+        aiohttp_retry.RetryClient: Session to share between all concurrent requests.
+    """
+    connector = aiohttp.TCPConnector(limit=32, keepalive_timeout=85)
+    timeout = aiohttp.ClientTimeout(total=60, sock_connect=REQUEST_TIMEOUT[0], sock_read=REQUEST_TIMEOUT[1])
+    retry_options = ExponentialRetry(
+        attempts=3,
+        start_timeout=0.5,
+        statuses=set(RETRY_STATUSES),
+        exceptions={aiohttp.ClientConnectorError},
+        retry_all_server_errors=False
+    )
+    return RetryClient(
+        client_session=aiohttp.ClientSession(connector=connector, timeout=timeout),
+        retry_options=retry_options
+    )
+
+class BackgroundLoop:
+    """Class to run coroutines on one long-lived event loop and aiohttp session.
+
+    The loop runs in a daemon thread, so the session's pooled connections are
+    reused by every coroutine run on it for the lifetime of the process, and
+    image_semaphore bounds the image generations of all of them together.
+    """
+
+    def __init__(self, warm_up_urls=()):
+        """Start the loop and open the session.
+
+        Args:
+            warm_up_urls (iterable): Endpoints to connect to ahead of the first request.
+        """
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        try:
+            self.session = self.run(self._open_session(list(warm_up_urls)))
+        except Exception:
+            # Stop the thread, the next attempt starts a loop of its own
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            raise
+
+    def run(self, coro):
+        """Run a coroutine on the loop and wait for its result.
+
+        Args:
+            coro: The coroutine to run.
+
+        Returns:
+            The coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _open_session(self, warm_up_urls):
+        """Create the session on the loop, warming up its connections in the background."""
+        self.image_semaphore = asyncio.Semaphore(MAX_CONCURRENT_IMAGES)
+        session = create_client_session()
+        for url in warm_up_urls:
+            asyncio.ensure_future(self._warm_up(session, url))
+        return session
+
+    @staticmethod
+    async def _warm_up(session, url):
+        """Leave a connection with a finished TLS handshake in the pool, ignoring the response."""
+        try:
+            async with session.head(url, timeout=aiohttp.ClientTimeout(total=2)):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+
+class AsyncWebstoryGenerator:
+    """Class to generate webstory images asynchronously using a WebstoryGenerator's settings."""
+
+    def __init__(self, generator, session, semaphore):
+        """Initialize the wrapper.
+
+        Args:
+            generator (WebstoryGenerator): Generator providing API details.
+            session (aiohttp_retry.RetryClient): Session used for the requests.
+            semaphore (asyncio.Semaphore): Bounds the image generations in flight,
+                shared by all concurrent webstories.
+        """
+        self.generator = generator
+        self.session = session
+        self._semaphore = semaphore
+
+    async def generate_webstory_image(self, text, style="webstory"):
+        """Generate a webstory image based on the provided text.
+
+        Args:
+            text (str): The text to generate an image for (title or bullet point).
+            style (str): The style of image to generate ("webstory" or "title").
+
+        Returns:
+            str: URL of the generated image.
+        """
+        async with self._semaphore:
+            return await self.generator.agenerate_webstory_image(self.session, text, style=style)
+
+    async def download_image(self, image_url):
+        """Download a generated image.
+
+        Args:
+            image_url (str): URL of the image.
+
+        Returns:
+            bytes: The image content.
+        """
+        async with self.session.get(image_url) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def generate_webstory_images(self, items, on_ready=None):
+        """Generate the images of several slides, with a single request where the API allows it.
+
+        Slides the batch request did not generate are generated one by one, concurrently.
+
+        Args:
+            items (list): (text, style) tuples, one per slide.
+            on_ready (callable): Called with the slide index and image URL as each image is ready.
+
+        Returns:
+            list: URLs of the generated images, in the same order as the items.
+        """
+        image_urls = await self.generator.agenerate_webstory_images(self.session, items)
+
+        async def generate_image(index, text, style):
+            image_url = image_urls[index]
+            if image_url is None:
+                image_url = await self.generate_webstory_image(text, style=style)
+            if on_ready is not None:
+                on_ready(index, image_url)
+            return image_url
+
+        return await asyncio.gather(*(generate_image(i, text, style) for i, (text, style) in enumerate(items)))
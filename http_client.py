@@ -0,0 +1,230 @@
+"""Shared HTTP session and request signing helpers for BytePlus API clients."""
+
+import os
+import time
+import hashlib
+import secrets
+import logging
+import threading
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeout in seconds for BytePlus API calls
+REQUEST_TIMEOUT = (3, 30)
+
+# Text-to-image generation routinely takes 5-30 s, so it gets a longer read timeout
+IMAGE_REQUEST_TIMEOUT = (3, 90)
+
+# Throttled and transient server error responses worth retrying
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """Class to stop calling an endpoint for a while after repeated failures.
+
+    Once fail_max consecutive requests have failed the breaker opens and
+    requests fail immediately for reset_timeout seconds. After that a request
+    is let through again; a success closes the breaker, a failure reopens it.
+    """
+
+    def __init__(self, fail_max=5, reset_timeout=30):
+        """Initialize the breaker in the closed state.
+
+        Args:
+            fail_max (int): Consecutive failures that open the breaker.
+            reset_timeout (float): Seconds the breaker stays open.
+        """
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Check that a request may be sent.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+        """
+        with self._lock:
+            if self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError("Too many recent failures, not sending request")
+
+    def record_success(self):
+        """Close the breaker after a successful request."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        """Count a failed request, opening the breaker once fail_max is reached."""
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.fail_max:
+                self._opened_at = time.monotonic()
+
+class BreakerSession(requests.Session):
+    """Session that routes every request through a circuit breaker."""
+
+    def __init__(self, breaker):
+        """Initialize the session.
+
+        Args:
+            breaker (CircuitBreaker): Breaker guarding the session's requests.
+        """
+        super().__init__()
+        self.breaker = breaker
+
+    def request(self, *args, **kwargs):
+        """Send a request unless the breaker is open, recording its outcome."""
+        self.breaker.before_call()
+        try:
+            response = super().request(*args, **kwargs)
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+def configure_logging():
+    """Set the log level from the LOG_LEVEL environment variable, WARNING by default.
+
+    The API clients log request details at debug level with lazy %-formatting,
+    so those calls are skipped cheaply unless LOG_LEVEL asks for them.
+    """
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+
+def create_session():
+    """Create a requests session with connection pooling, retries and a circuit breaker.
+
+    Connections are kept alive and reused across calls, so only the first
+    request to an endpoint pays for the TCP and TLS handshake. Throttled and
+    server error responses are retried with exponential backoff, honouring
+    Retry-After, and once retries keep failing the circuit breaker fails
+    further requests fast instead of letting each one wait out its retries.
+    Read errors and timeouts are not retried: the request has already been
+    sent, and repeating a POST would bill another generation.
+
+    Returns:
+        requests.Session: Session with a pooled adapter mounted for http and https.
+    """
+    retries = Retry(
+        total=4,
+        read=False,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["HEAD", "GET", "POST"],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retries)
+
+    session = BreakerSession(CircuitBreaker(fail_max=5, reset_timeout=30))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def warm_up(session, url):
+    """Open a pooled connection to an endpoint in the background.
+
+    Sends a HEAD request from a daemon thread so the TCP and TLS handshake is
+    done before the first real request. The response and any errors are
+    ignored, the request only serves to leave a warm socket in the pool.
+
+    Args:
+        session (requests.Session): Session whose pool should hold the connection.
+        url (str): Endpoint to connect to.
+    """
+    def head():
+        try:
+            session.head(url, timeout=2)
+        except requests.exceptions.RequestException:
+            pass
+
+    threading.Thread(target=head, daemon=True).start()
+
+def create_signer(api_secret):
+    """Create the request signing function for the BytePlus text-to-image API.
+
+    The signature is the SHA-1 of the nonce, the API secret and the timestamp
+    joined in lexicographic order. The nonce and timestamp are decimal strings,
+    so unless the secret starts with a digit its position in that order is
+    fixed and only the nonce and timestamp need comparing.
+
+    Args:
+        api_secret (str): The API secret.
+
+    Returns:
+        callable: Function taking the nonce and timestamp strings and returning
+            the lowercase hex signature. It holds no mutable state, so it can be
+            called from concurrent requests.
+    """
+    if api_secret[0] > "9":
+        def sign(nonce, timestamp):
+            low, high = (nonce, timestamp) if nonce <= timestamp else (timestamp, nonce)
+            return hashlib.sha1(f"{low}{high}{api_secret}".encode('utf-8')).hexdigest()
+    elif api_secret[0] < "0":
+        def sign(nonce, timestamp):
+            low, high = (nonce, timestamp) if nonce <= timestamp else (timestamp, nonce)
+            return hashlib.sha1(f"{api_secret}{low}{high}".encode('utf-8')).hexdigest()
+    else:
+        def sign(nonce, timestamp):
+            return hashlib.sha1(''.join(sorted((nonce, api_secret, timestamp))).encode('utf-8')).hexdigest()
+    return sign
+
+def signed_params(api_key, sign):
+    """Build the query parameters authenticating a text-to-image API request.
+
+    The nonce comes from a CSPRNG, so it cannot be predicted from earlier requests.
+
+    Args:
+        api_key (str): The API key.
+        sign (callable): Signing function from create_signer.
+
+    Returns:
+        dict: API key, timestamp, nonce and signature.
+    """
+    timestamp = str(int(time.time()))
+    nonce = str(secrets.randbits(31))
+    return {
+        "api_key": api_key,
+        "timestamp": timestamp,
+        "nonce": nonce,
+        "sign": sign(nonce, timestamp)
+    }
+
+def build_chat_body_prefix(model_id, system_prompt):
+    """Serialize the static start of a chat completion request body.
+
+    The model and system prompt are the same for every request of a kind, so
+    they are serialized once and only the user message is encoded per call.
+
+    Args:
+        model_id (str): The model or endpoint ID.
+        system_prompt (str): The system prompt.
+
+    Returns:
+        bytes: JSON body up to where the user message content starts.
+    """
+    static_body = orjson.dumps({"model": model_id, "messages": [{"role": "system", "content": system_prompt}]})
+    # Reopen the messages array (drop the closing "]}") to append the user message
+    return static_body[:-2] + b',{"role":"user","content":'
+
+def encode_chat_body(prefix, user_content):
+    """Complete a chat completion request body started by build_chat_body_prefix.
+
+    Args:
+        prefix (bytes): Body prefix from build_chat_body_prefix.
+        user_content (str): Content of the user message.
+
+    Returns:
+        bytes: The complete JSON request body.
+    """
+    return prefix + orjson.dumps(user_content) + b'}]}'
@@ -1,20 +1,28 @@
 """Module for infographic generation using BytePlus text-to-image API."""
 
 import os
-import time
-import random
-import hashlib
-import requests
+import logging
+import orjson
 from dotenv import load_dotenv
 
+from http_client import IMAGE_REQUEST_TIMEOUT, create_session, create_signer, signed_params, warm_up
+from llm_cache import IMAGE_URL_TTL, get_default_cache
+from semantic_cache import get_semantic_cache
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class InfographicGenerator:
     """Class to handle infographic generation using BytePlus text-to-image API."""
     
-    def __init__(self):
-        """Initialize the generator with API details from environment variables."""
+    def __init__(self, cache=None):
+        """Initialize the generator with API details from environment variables.
+        
+        Args:
+            cache (LLMCache): Response cache, defaults to the shared cache.
+        """
         self.api_key = os.getenv("CV_API_KEY")
         self.api_secret = os.getenv("CV_API_SECRET")
         self.api_endpoint = os.getenv("CV_API_ENDPOINT")
@@ -22,50 +30,18 @@ class InfographicGenerator:
         
         if not all([self.api_key, self.api_secret, self.api_endpoint, self.req_key]):
             raise ValueError("Missing required environment variables for text-to-image API")
-    
-    def _generate_signature(self, nonce, timestamp):
-        """Generate signature for API authentication.
-        
-        Args:
-            nonce (int): Random nonce value.
-            timestamp (int): Current timestamp.
-            
-        Returns:
-            str: Generated signature.
-        """
-        keys = [str(nonce), self.api_secret, str(timestamp)]
-        keys.sort()
-        key_str = ''.join(keys).encode('utf-8')
-        signature = hashlib.sha1(key_str).hexdigest()
-        return signature.lower()
-    
-    def generate_infographic(self, article_title):
-        """Generate an infographic based on the article title."""
-        #print(f" --- Image_generator.py --- Generating infographic for title: {article_title}")  # Debug title value
-        timestamp = int(time.time())
-        nonce = random.randint(0, (1 << 31) - 1)
-        
-        # Parameters for signature
-        req_params = {
-            "api_key": self.api_key,
-            "timestamp": str(timestamp),
-            "nonce": str(nonce),
-            "sign": self._generate_signature(nonce, timestamp)
-        }
         
-        # Request headers
-        req_headers = {
+        # Reuse pooled connections across API calls
+        self.session = create_session()
+        warm_up(self.session, self.api_endpoint)
+        self._sign = create_signer(self.api_secret)
+        self.headers = {
             "Content-Type": "application/json"
         }
         
-        # Clean the title before API call
-        cleaned_title = article_title.strip('*')
-        print(f" --- Image_generator.py --- Generating infographic for title: {cleaned_title}")
-        
-        # Request body
-        req_body = {
+        # Static part of the request body, only the prompt changes per call
+        self._body_template = {
             "req_key": self.req_key,
-            "prompt": cleaned_title,  # Use cleaned title
             "return_url": True,
             "logo_info": {
                 "add_logo": True,
@@ -75,13 +51,37 @@ class InfographicGenerator:
                 "logo_text_content": "@BytePlus 2025"
             }
         }
+        self.cache = cache or get_default_cache()
+        self.semantic_cache = get_semantic_cache("infographic", ttl=IMAGE_URL_TTL)
+    
+    def generate_infographic(self, article_title):
+        """Generate an infographic based on the article title."""
+        # Parameters for signature
+        req_params = signed_params(self.api_key, self._sign)
+        
+        # Clean the title before API call
+        cleaned_title = article_title.strip('*')
+        logger.debug("Generating infographic for title: %s", cleaned_title)
+        
+        # Request body
+        req_body = {**self._body_template, "prompt": cleaned_title}  # Use cleaned title
+        
+        # Identical requests produce equivalent images, so serve repeats from the cache,
+        # falling back to the image of a near-duplicate title if semantic caching is on
+        cache_key = self.cache.make_key(req_body, self.req_key)
+        cached_url = self.cache.get(cache_key, ttl=IMAGE_URL_TTL)
+        if cached_url is None and self.semantic_cache is not None:
+            cached_url = self.semantic_cache.lookup(cleaned_title)
+        if cached_url is not None:
+            return cached_url
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.api_endpoint,
                 params=req_params,
-                headers=req_headers,
-                json=req_body
+                headers=self.headers,
+                data=orjson.dumps(req_body),
+                timeout=IMAGE_REQUEST_TIMEOUT
             )
             response.raise_for_status()
             
@@ -91,7 +91,11 @@ class InfographicGenerator:
                 raise Exception(f"API error: {result['message']}")
             
             # Return the first image URL
-            return result["data"]["image_urls"][0]
+            image_url = result["data"]["image_urls"][0]
+            self.cache.set(cache_key, image_url)
+            if self.semantic_cache is not None:
+                self.semantic_cache.add(cleaned_title, image_url)
+            return image_url
             
         except Exception as e:
             raise Exception(f"Failed to generate infographic: {str(e)}")
\ No newline at end of file
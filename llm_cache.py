@@ -0,0 +1,106 @@
+"""Module for caching BytePlus API responses in a local SQLite database."""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Cached responses expire after 7 days
+DEFAULT_TTL = 7 * 24 * 60 * 60
+
+# Generated image URLs are reused for an hour, well before the provider expires them
+IMAGE_URL_TTL = 60 * 60
+
+class LLMCache:
+    """Class to cache API responses keyed by a hash of the prompt and model."""
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        """Open (or create) the cache database.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            ttl (int): Number of seconds a cached response stays valid.
+        """
+        self.path = path or os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        # A single connection is shared between threads, guarded by a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response_json TEXT NOT NULL, ts REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM responses WHERE ts < ?", (time.time() - self.ttl,))
+
+    @staticmethod
+    def make_key(prompt, model):
+        """Build the cache key for a request.
+
+        Args:
+            prompt: JSON-serializable prompt (text, messages or request body).
+            model (str): Model or request key the prompt is sent to.
+
+        Returns:
+            str: Hex encoded SHA-256 digest of the prompt and model.
+        """
+        key_str = json.dumps({"prompt": prompt, "model": model}, sort_keys=True)
+        return hashlib.sha256(key_str.encode('utf-8')).hexdigest()
+
+    def get(self, key, ttl=None):
+        """Look up a cached response.
+
+        Args:
+            key (str): Cache key from make_key.
+            ttl (int): Number of seconds the response stays valid, if shorter than the cache's ttl.
+
+        Returns:
+            The cached response, or None if it is missing or expired.
+        """
+        ttl = min(ttl, self.ttl) if ttl is not None else self.ttl
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response_json, ts FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < time.time() - ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, response):
+        """Store a response in the cache.
+
+        Args:
+            key (str): Cache key from make_key.
+            response: JSON-serializable response to store.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response_json, ts) VALUES (?, ?, ?)",
+                (key, json.dumps(response), time.time())
+            )
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache():
+    """Return the process-wide cache shared by all API clients.
+
+    Returns:
+        LLMCache: The shared cache instance.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
@@ -1,21 +1,118 @@
 import os
-import requests
+import json
+import asyncio
+import logging
 from dotenv import load_dotenv
 
+from http_client import REQUEST_TIMEOUT, build_chat_body_prefix, create_session, encode_chat_body
+from llm_cache import get_default_cache
+from semantic_cache import get_semantic_cache
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# System prompts are module constants so every request sends a byte-identical
+# prefix; only the user message varies. Providers reuse cached prompt prefixes
+# only when they match exactly and exceed a minimum length (~500 tokens), which
+# the shared style guide below is sized to meet. Do not interpolate anything here.
+VISUAL_STYLE_GUIDE = (
+    "Style guide for image prompts. "
+    "The prompt is sent to a text-to-image model that renders a vertical 720 by 1280 "
+    "slide for a mobile news webstory, so describe a single scene that reads well in a "
+    "tall portrait frame with the main subject in the centre and open space in the lower "
+    "third where caption text is overlaid. "
+    "Describe what a camera would see: the main subject, the setting, the time of day, "
+    "the lighting and one or two supporting details that tell the story. "
+    "Prefer a realistic editorial photography look, natural colours, shallow depth of "
+    "field and soft directional light. Use an illustrated or symbolic scene only when "
+    "the news is abstract, for example economic figures, policy decisions or scientific "
+    "results, and then choose a concrete everyday object or place that stands for it. "
+    "Do not ask for any written words, letters, numbers, charts with labels, logos, "
+    "watermarks, brand names or user interface elements in the image, because the "
+    "image model renders text poorly and the slide already carries the caption. "
+    "Do not name or depict identifiable real people, including politicians, athletes "
+    "and celebrities; describe their role instead, such as a central bank official at "
+    "a podium or a footballer celebrating in a stadium. "
+    "Avoid graphic violence, injuries, weapons pointed at people, distressing imagery "
+    "of disasters and anything sensational; for such stories show the aftermath, the "
+    "response or a symbolic object instead. "
+    "Keep the tone neutral and factual, matching a serious news publication, and avoid "
+    "humour, exaggeration and emotional manipulation. "
+    "Slides of one webstory are shown one after another, so keep the look consistent: "
+    "similar lighting, a similar colour palette and a similar camera distance across "
+    "the cover and the following slides, and avoid busy backgrounds that compete with "
+    "the caption. Prefer places, objects and anonymous people in action over generic "
+    "stock scenes such as handshakes, globes or people pointing at screens, and pick "
+    "the one detail that makes this particular story recognisable. "
+    "Do not add camera brands, artist names, resolution keywords or quality tags. "
+    "Write each prompt in plain descriptive English without markdown, labels such as "
+    "Visual prompt, line breaks, or single or double quotes inside the prompt text. "
+)
+
+TITLE_PROMPT_INSTRUCTION = (
+    "You write prompts for generating the cover image of a news webstory. "
+    "The user message is the news article title. "
+    "Convert the title into a visual description. "
+    "Focus on key visual elements only. "
+    "Keep it under 150 characters and as one complete sentence. "
+    "Make sure that there is no single or double quotes used in the response text. "
+    "Respond with the prompt text only and nothing else. "
+    + VISUAL_STYLE_GUIDE
+)
+
+BULLET_PROMPT_INSTRUCTION = (
+    "You write prompts for generating the image of one slide of a news webstory. "
+    "The user message is a bullet point from the news article summary. "
+    "Convert the bullet point into a visual description. "
+    "Focus on key visual elements only. "
+    "Keep it under 150 characters and as one complete sentence. "
+    "Make sure that there is no single or double quotes used in the response text. "
+    "Respond with the prompt text only and nothing else. "
+    + VISUAL_STYLE_GUIDE
+)
+
+BATCH_BULLET_PROMPT_INSTRUCTION = (
+    "You write prompts for generating the images of the slides of a news webstory. "
+    "The user message is a JSON array of bullet points from the news article summary. "
+    "Convert each bullet point into a visual description. "
+    "Focus on key visual elements only. "
+    "Keep each description under 150 characters and as one complete sentence. "
+    "Respond with a JSON array of strings only, containing exactly one description "
+    "per bullet point, in the same order as the bullet points. "
+    + VISUAL_STYLE_GUIDE
+)
+
 class PromptGenerator:
     """Class to enhance webstory prompts using BytePlus LLM API."""
     
-    def __init__(self):
-        """Initialize the generator with API details from environment variables."""
+    def __init__(self, cache=None):
+        """Initialize the generator with API details from environment variables.
+        
+        Args:
+            cache (LLMCache): Response cache, defaults to the shared cache.
+        """
         self.api_key = os.getenv("ARK_API_KEY")
         self.api_endpoint = os.getenv("ARK_API_ENDPOINT")
         self.model_id = os.getenv("ARK_MODEL_ID")
         
         if not all([self.api_key, self.api_endpoint, self.model_id]):
             raise ValueError("Missing required environment variables for LLM API")
+        
+        # Reuse pooled connections across API calls
+        self.session = create_session()
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        self._body_prefixes = {
+            instruction: build_chat_body_prefix(self.model_id, instruction)
+            for instruction in (TITLE_PROMPT_INSTRUCTION, BULLET_PROMPT_INSTRUCTION, BATCH_BULLET_PROMPT_INSTRUCTION)
+        }
+        self.cache = cache or get_default_cache()
+        self.title_semantic_cache = get_semantic_cache("title_prompt")
+        self.bullet_semantic_cache = get_semantic_cache("bullet_prompt")
     
     def enhance_title_prompt(self, title):
         """Enhance the title prompt for better image generation.
@@ -26,41 +123,23 @@ class PromptGenerator:
         Returns:
             str: Enhanced prompt for image generation.
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        prompt_instruction = (
-            "Convert this title into a visual description. "
-            "Focus on key visual elements only. "
-            "Keep it under 150 characters and as one complete sentence."
-            "Make sure that there is no single or double quotes used in the response text."
-        )
-        
-        payload = {
-            "model": self.model_id,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": prompt_instruction
-                },
-                {
-                    "role": "user",
-                    "content": "I need prompt for generating cover image for news article title : "+ title
-                }
-            ]
-        }
-        
         try:
-            response = requests.post(self.api_endpoint, headers=headers, json=payload)
-            response.raise_for_status()
-            
-            result = response.json()
-            enhanced_prompt = result["choices"][0]["message"]["content"]
-            print(f"\n PG.py Title Prompt Enhancement:\nOriginal: {title}\nEnhanced: {enhanced_prompt}\n")
-            return enhanced_prompt.strip()
+            return self._enhance(title, TITLE_PROMPT_INSTRUCTION, self.title_semantic_cache)
+        except Exception as e:
+            raise Exception(f"Failed to enhance title prompt: {str(e)}")
+    
+    async def aenhance_title_prompt(self, session, title):
+        """Enhance the title prompt for better image generation, asynchronously.
+        
+        Args:
+            session (aiohttp.ClientSession): Session used for the request.
+            title (str): The original webstory title.
             
+        Returns:
+            str: Enhanced prompt for image generation.
+        """
+        try:
+            return await self._aenhance(session, title, TITLE_PROMPT_INSTRUCTION, self.title_semantic_cache)
         except Exception as e:
             raise Exception(f"Failed to enhance title prompt: {str(e)}")
     
@@ -73,40 +152,218 @@ class PromptGenerator:
         Returns:
             str: Enhanced prompt for image generation.
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        prompt_instruction = (
-            "Convert this news bullet point into a visual description. "
-            "Focus on key visual elements only. "
-            "Keep it under 150 characters and as one complete sentence."
-            "Make sure that there is no single or double quotes used in the response text."
-        )
-        
-        payload = {
-            "model": self.model_id,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": prompt_instruction
-                },
-                {
-                    "role": "user",
-                    "content": "I need prompt for generating cover image for news article : " + bullet_point
-                }
-            ]
-        }
+        try:
+            return self._enhance(bullet_point, BULLET_PROMPT_INSTRUCTION, self.bullet_semantic_cache)
+        except Exception as e:
+            raise Exception(f"Failed to enhance bullet point prompt: {str(e)}")
+    
+    def enhance_bullets_batch(self, bullets):
+        """Enhance the prompts of several bullet points with a single LLM request.
         
+        Args:
+            bullets (list): The original bullet points.
+            
+        Returns:
+            list: Enhanced prompts for image generation, in the same order as the bullets.
+        """
         try:
-            response = requests.post(self.api_endpoint, headers=headers, json=payload)
+            # Bullets enhanced before, in a batch or on their own, are not sent again
+            enhanced_prompts, missing = self._lookup_batch(bullets)
+            if not missing:
+                return enhanced_prompts
+            
+            missing_bullets = [bullets[i] for i, _ in missing]
+            body = self._build_body(json.dumps(missing_bullets, ensure_ascii=False), BATCH_BULLET_PROMPT_INSTRUCTION)
+            response = self.session.post(self.api_endpoint, headers=self.headers, data=body, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             
-            result = response.json()
-            enhanced_prompt = result["choices"][0]["message"]["content"]
-            print(f"\n PG.py Bullet Point Prompt Enhancement:\nOriginal: {bullet_point}\nEnhanced: {enhanced_prompt}\n")
-            return enhanced_prompt.strip()
+            self._store_batch(bullets, missing, self._parse_batch_response(response.json(), missing_bullets), enhanced_prompts)
+            return enhanced_prompts
+            
+        except Exception as e:
+            raise Exception(f"Failed to enhance bullet point prompts: {str(e)}")
+    
+    async def aenhance_bullets_batch(self, session, bullets):
+        """Enhance the prompts of several bullet points with a single LLM request, asynchronously.
+        
+        Args:
+            session (aiohttp.ClientSession): Session used for the request.
+            bullets (list): The original bullet points.
+            
+        Returns:
+            list: Enhanced prompts for image generation, in the same order as the bullets.
+        """
+        try:
+            enhanced_prompts, missing = await asyncio.to_thread(self._lookup_batch, bullets)
+            if not missing:
+                return enhanced_prompts
+            
+            missing_bullets = [bullets[i] for i, _ in missing]
+            body = self._build_body(json.dumps(missing_bullets, ensure_ascii=False), BATCH_BULLET_PROMPT_INSTRUCTION)
+            async with session.post(self.api_endpoint, headers=self.headers, data=body) as response:
+                response.raise_for_status()
+                result = await response.json(content_type=None)
+            
+            new_prompts = self._parse_batch_response(result, missing_bullets)
+            await asyncio.to_thread(self._store_batch, bullets, missing, new_prompts, enhanced_prompts)
+            return enhanced_prompts
             
         except Exception as e:
-            raise Exception(f"Failed to enhance bullet point prompt: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to enhance bullet point prompts: {str(e)}")
+    
+    def _enhance(self, text, instruction, semantic_cache):
+        """Enhance a prompt, serving repeated and near-duplicate texts from the caches.
+        
+        Args:
+            text (str): The title or bullet point to enhance.
+            instruction (str): The system prompt to use.
+            semantic_cache (SemanticCache): Semantic cache for this kind of text, or None.
+            
+        Returns:
+            str: Enhanced prompt for image generation.
+        """
+        cache_key, cached_prompt = self._lookup(text, instruction, semantic_cache)
+        if cached_prompt is not None:
+            return cached_prompt
+        
+        body = self._build_body(text, instruction)
+        response = self.session.post(self.api_endpoint, headers=self.headers, data=body, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        
+        enhanced_prompt = self._parse_response(response.json(), text)
+        self._store(cache_key, text, semantic_cache, enhanced_prompt)
+        return enhanced_prompt
+    
+    async def _aenhance(self, session, text, instruction, semantic_cache):
+        """Asynchronous _enhance, with the blocking cache calls run in worker threads."""
+        cache_key, cached_prompt = await asyncio.to_thread(self._lookup, text, instruction, semantic_cache)
+        if cached_prompt is not None:
+            return cached_prompt
+        
+        body = self._build_body(text, instruction)
+        async with session.post(self.api_endpoint, headers=self.headers, data=body) as response:
+            response.raise_for_status()
+            result = await response.json(content_type=None)
+        
+        enhanced_prompt = self._parse_response(result, text)
+        await asyncio.to_thread(self._store, cache_key, text, semantic_cache, enhanced_prompt)
+        return enhanced_prompt
+    
+    def _build_body(self, text, instruction):
+        """Build the JSON body of a prompt enhancement request.
+        
+        Args:
+            text (str): The title or bullet point to enhance.
+            instruction (str): The system prompt to use.
+            
+        Returns:
+            bytes: The serialized request body.
+        """
+        return encode_chat_body(self._body_prefixes[instruction], text)
+    
+    def _lookup(self, text, instruction, semantic_cache):
+        """Look up a previously enhanced prompt for a request.
+        
+        Args:
+            text (str): The title or bullet point to enhance.
+            instruction (str): The system prompt to use.
+            semantic_cache (SemanticCache): Semantic cache for this kind of text, or None.
+            
+        Returns:
+            tuple: The cache key and the cached prompt, or None on a miss.
+        """
+        messages = [
+            {"role": "system", "content": instruction},
+            {"role": "user", "content": text}
+        ]
+        cache_key = self.cache.make_key(messages, self.model_id)
+        cached_prompt = self.cache.get(cache_key)
+        if cached_prompt is None and semantic_cache is not None:
+            cached_prompt = semantic_cache.lookup(text)
+        return cache_key, cached_prompt
+    
+    def _store(self, cache_key, text, semantic_cache, enhanced_prompt):
+        """Store an enhanced prompt in the caches.
+        
+        Args:
+            cache_key (str): The cache key returned by _lookup.
+            text (str): The title or bullet point that was enhanced.
+            semantic_cache (SemanticCache): Semantic cache for this kind of text, or None.
+            enhanced_prompt (str): The enhanced prompt.
+        """
+        self.cache.set(cache_key, enhanced_prompt)
+        if semantic_cache is not None:
+            semantic_cache.add(text, enhanced_prompt)
+    
+    def _lookup_batch(self, bullets):
+        """Look up the previously enhanced prompts of several bullet points.
+        
+        Each bullet point is cached on its own, under the same key as
+        enhance_bullet_prompt uses, so batches share results with each other
+        and with single enhancements.
+        
+        Args:
+            bullets (list): The original bullet points.
+            
+        Returns:
+            tuple: The prompts in bullet order, None for the misses, and
+                (index, cache key) pairs of the missed bullet points.
+        """
+        enhanced_prompts = []
+        missing = []
+        for i, bullet in enumerate(bullets):
+            cache_key, cached_prompt = self._lookup(bullet, BULLET_PROMPT_INSTRUCTION, self.bullet_semantic_cache)
+            enhanced_prompts.append(cached_prompt)
+            if cached_prompt is None:
+                missing.append((i, cache_key))
+        return enhanced_prompts, missing
+    
+    def _store_batch(self, bullets, missing, new_prompts, enhanced_prompts):
+        """Store the prompts of a batch enhancement and fill them in.
+        
+        Args:
+            bullets (list): The original bullet points.
+            missing (list): (index, cache key) pairs returned by _lookup_batch.
+            new_prompts (list): The enhanced prompts of the missed bullet points, in order.
+            enhanced_prompts (list): The prompts returned by _lookup_batch, updated in place.
+        """
+        for (i, cache_key), enhanced_prompt in zip(missing, new_prompts):
+            self._store(cache_key, bullets[i], self.bullet_semantic_cache, enhanced_prompt)
+            enhanced_prompts[i] = enhanced_prompt
+    
+    @staticmethod
+    def _parse_response(result, text):
+        """Extract the enhanced prompt from an LLM API response.
+        
+        Args:
+            result (dict): The decoded API response.
+            text (str): The title or bullet point that was enhanced.
+            
+        Returns:
+            str: Enhanced prompt for image generation.
+        """
+        enhanced_prompt = result["choices"][0]["message"]["content"]
+        logger.debug("Prompt enhancement: original=%r enhanced=%r", text, enhanced_prompt)
+        return enhanced_prompt.strip()
+    
+    @staticmethod
+    def _parse_batch_response(result, bullets):
+        """Extract the enhanced prompts from a batch enhancement response.
+        
+        Args:
+            result (dict): The decoded API response.
+            bullets (list): The bullet points that were enhanced.
+            
+        Returns:
+            list: Enhanced prompts for image generation, in the same order as the bullets.
+        """
+        content = result["choices"][0]["message"]["content"]
+        
+        # Drop any code fence or commentary around the JSON array
+        start = content.find("[")
+        end = content.rfind("]") + 1
+        enhanced_prompts = json.loads(content[start:end])
+        
+        if len(enhanced_prompts) != len(bullets):
+            raise ValueError(f"Expected {len(bullets)} prompts, got {len(enhanced_prompts)}")
+        return [str(prompt).strip() for prompt in enhanced_prompts]
\ No newline at end of file
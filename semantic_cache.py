@@ -0,0 +1,160 @@
+"""Module for reusing results of semantically similar prompts via sentence embeddings.
+
+The cache is optional: it is only enabled when SEMANTIC_CACHE_ENABLED is set
+and the sentence-transformers, faiss and numpy packages are installed. Those
+packages are slow to import, so they are only imported once the cache is enabled.
+"""
+
+import os
+import json
+import time
+import threading
+from functools import lru_cache
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_DIM = 384
+
+# Imported by _import_dependencies
+faiss = None
+np = None
+SentenceTransformer = None
+
+_model = None
+_model_lock = threading.Lock()
+_caches = {}
+
+def _import_dependencies():
+    """Import the embedding and index packages.
+
+    Returns:
+        bool: Whether the packages are installed.
+    """
+    global faiss, np, SentenceTransformer
+    if faiss is None:
+        try:
+            import faiss as faiss_module
+            import numpy as numpy_module
+            from sentence_transformers import SentenceTransformer as model_class
+        except ImportError:
+            return False
+        np, SentenceTransformer, faiss = numpy_module, model_class, faiss_module
+    return True
+
+def _get_model():
+    """Load the embedding model once per process."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = SentenceTransformer(MODEL_NAME, device="cpu")
+        return _model
+
+@lru_cache(maxsize=256)
+def _embed(text):
+    """Return the L2-normalized float32 embedding of a text as a 1 x 384 array."""
+    vector = _get_model().encode([text], normalize_embeddings=True)
+    return np.asarray(vector, dtype="float32")
+
+class SemanticCache:
+    """Class to return stored results for texts similar to previously seen ones."""
+
+    def __init__(self, name, threshold=0.92, cache_dir="semantic_cache", ttl=None):
+        """Load the index for the given name from disk, or start an empty one.
+
+        Args:
+            name (str): Name of the cache, one index is kept per name.
+            threshold (float): Minimum cosine similarity for a hit.
+            cache_dir (str): Directory the index and stored values are persisted to.
+            ttl (int): Number of seconds a stored value stays valid, None to keep values forever.
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.index_path = os.path.join(cache_dir, f"{name}.index")
+        self.values_path = os.path.join(cache_dir, f"{name}.json")
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.index_path) and os.path.exists(self.values_path):
+            self.index = faiss.read_index(self.index_path)
+            with open(self.values_path, encoding="utf-8") as f:
+                stored = json.load(f)
+            if isinstance(stored, list):
+                # Values stored without timestamps are treated as expired
+                stored = {"values": stored, "timestamps": [0] * len(stored)}
+            self.values = stored["values"]
+            self.timestamps = stored["timestamps"]
+        else:
+            # Inner product over normalized vectors is cosine similarity
+            self.index = faiss.IndexFlatIP(EMBEDDING_DIM)
+            self.values = []
+            self.timestamps = []
+
+    def lookup(self, text):
+        """Find the stored result for the most similar previously seen text.
+
+        Args:
+            text (str): The incoming title or bullet point.
+
+        Returns:
+            The stored result of the most similar unexpired text reaching the threshold, otherwise None.
+        """
+        vector = _embed(text)
+        with self._lock:
+            if self.index.ntotal == 0:
+                return None
+            # Look past the best match in case it has expired and been stored again since
+            scores, ids = self.index.search(vector, min(self.index.ntotal, 8))
+            for score, match in zip(scores[0], ids[0]):
+                if score < self.threshold:
+                    break
+                if self.ttl is None or self.timestamps[match] >= time.time() - self.ttl:
+                    return self.values[match]
+        return None
+
+    def add(self, text, value):
+        """Store the result for a text and persist the index to disk.
+
+        Args:
+            text (str): The title or bullet point the result was generated for.
+            value: JSON-serializable result to return for similar texts.
+        """
+        vector = _embed(text)
+        with self._lock:
+            self.index.add(vector)
+            self.values.append(value)
+            self.timestamps.append(time.time())
+            faiss.write_index(self.index, self.index_path)
+            tmp_path = f"{self.values_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"values": self.values, "timestamps": self.timestamps}, f)
+            os.replace(tmp_path, self.values_path)
+
+def get_semantic_cache(name, ttl=None):
+    """Return the shared semantic cache for a name, if semantic caching is enabled.
+
+    Args:
+        name (str): Name of the cache, e.g. "title_prompt".
+        ttl (int): Number of seconds a stored value stays valid, None to keep values forever.
+
+    Returns:
+        SemanticCache: The cache, or None when disabled or its dependencies are missing.
+    """
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "").lower() not in ("1", "true", "yes"):
+        return None
+    if not _import_dependencies():
+        return None
+
+    with _model_lock:
+        if name not in _caches:
+            _caches[name] = SemanticCache(
+                name,
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+                cache_dir=os.getenv("SEMANTIC_CACHE_DIR", "semantic_cache"),
+                ttl=ttl
+            )
+    # Load the model up front rather than on the first lookup
+    _get_model()
+    return _caches[name]
@@ -1,15 +1,24 @@
 """Module for saving images and articles to BytePlus object storage."""
 
 import os
-import requests
-import tempfile
+import re
 from datetime import datetime
 import tos
 from dotenv import load_dotenv
 
+from http_client import REQUEST_TIMEOUT, create_session
+
 # Load environment variables
 load_dotenv()
 
+# Characters not allowed in object key titles; \W matches exactly the non-alphanumeric
+# characters (underscore maps to itself), so keys match the old per-character cleanup
+_UNSAFE_TITLE_CHARS = re.compile(r'\W')
+
+def object_key_title(title):
+    """Shorten a title and replace its unsafe characters for use in an object key."""
+    return _UNSAFE_TITLE_CHARS.sub('_', title[:50])
+
 class StorageManager:
     """Class to handle saving images and articles to BytePlus object storage."""
     
@@ -33,36 +42,9 @@ class StorageManager:
             self.endpoint,
             self.region
         )
-    
-    def _download_image(self, image_url):
-        """Download image from URL to a temporary file.
         
-        Args:
-            image_url (str): URL of the image to download.
-            
-        Returns:
-            str: Path to the temporary file containing the image.
-            
-        Raises:
-            Exception: If downloading fails.
-        """
-        try:
-            response = requests.get(image_url, stream=True)
-            response.raise_for_status()
-            
-            # Create a temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            temp_file_path = temp_file.name
-            
-            # Write the image content to the temporary file
-            with open(temp_file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
-            return temp_file_path
-            
-        except Exception as e:
-            raise Exception(f"Failed to download image: {str(e)}")
+        # Reuse pooled connections when fetching generated images
+        self.session = create_session()
     
     def save_image(self, image_url, article_title):
         """Save the image to BytePlus object storage.
@@ -81,30 +63,33 @@ class StorageManager:
             # Generate a unique object key based on timestamp and article title
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
             # Clean article title to use as part of the filename
-            clean_title = ''.join(c if c.isalnum() else '_' for c in article_title)[:50]
+            clean_title = object_key_title(article_title)
             object_key = f"{self.object_key_prefix}/images/{timestamp}_{clean_title}.jpg"
             
-            # Download the image to a temporary file
-            temp_file_path = self._download_image(image_url)
-            
-            try:
+            # Stream the image straight from the generated URL into object storage
+            # instead of buffering it in a temporary file first
+            with self.session.get(image_url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                
+                # The header only matches the streamed bytes when the body is not encoded
+                content_length = None
+                if "Content-Length" in response.headers and "Content-Encoding" not in response.headers:
+                    content_length = int(response.headers["Content-Length"])
+                
                 # Upload the image to BytePlus Object Storage
-                self.client.put_object_from_file(
+                self.client.put_object(
                     self.bucket_name,
                     object_key,
-                    temp_file_path
+                    content_length=content_length,
+                    content=response.raw
                 )
-                
-                # Generate a URL for the uploaded image
-                # Note: This is a simple URL construction, you might need to adjust based on your actual setup
-                storage_url = f"https://{self.bucket_name}.{self.endpoint}/{object_key}"
-                
-                return storage_url
-                
-            finally:
-                # Clean up the temporary file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            
+            # Generate a URL for the uploaded image
+            # Note: This is a simple URL construction, you might need to adjust based on your actual setup
+            storage_url = f"https://{self.bucket_name}.{self.endpoint}/{object_key}"
+            
+            return storage_url
                     
         except tos.exceptions.TosClientError as e:
             raise Exception(f"Client error saving image: {e.message}, cause: {e.cause}")
@@ -131,38 +116,25 @@ class StorageManager:
             # Generate a unique object key based on timestamp and article title
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
             # Clean article title to use as part of the filename
-            clean_title = ''.join(c if c.isalnum() else '_' for c in article_title)[:50]
+            clean_title = object_key_title(article_title)
             object_key = f"{self.object_key_prefix}/articles/{timestamp}_{clean_title}.txt"
             
-            # Create a temporary file with the article content
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix=".txt") as temp_file:
-                temp_file_path = temp_file.name
-                
-                # Write article title, content, and summary to the file
-                temp_file.write(f"Title: {article_title}\n\n")
-                temp_file.write(f"Content:\n{article_text}\n\n")
-                temp_file.write("Summary:\n")
-                for point in summary_points:
-                    temp_file.write(f"- {point}\n")
+            # Build the article title, content, and summary in memory
+            lines = [f"Title: {article_title}\n\n", f"Content:\n{article_text}\n\n", "Summary:\n"]
+            lines.extend(f"- {point}\n" for point in summary_points)
             
-            try:
-                # Upload the article to BytePlus Object Storage
-                self.client.put_object_from_file(
-                    self.bucket_name,
-                    object_key,
-                    temp_file_path
-                )
-                
-                # Generate a URL for the uploaded article
-                # Note: This is a simple URL construction, you might need to adjust based on your actual setup
-                storage_url = f"https://{self.bucket_name}.{self.endpoint}/{object_key}"
-                
-                return storage_url
-                
-            finally:
-                # Clean up the temporary file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            # Upload the article to BytePlus Object Storage
+            self.client.put_object(
+                self.bucket_name,
+                object_key,
+                content="".join(lines).encode('utf-8')
+            )
+            
+            # Generate a URL for the uploaded article
+            # Note: This is a simple URL construction, you might need to adjust based on your actual setup
+            storage_url = f"https://{self.bucket_name}.{self.endpoint}/{object_key}"
+            
+            return storage_url
                     
         except tos.exceptions.TosClientError as e:
             raise Exception(f"Client error saving article: {e.message}, cause: {e.cause}")
@@ -1,12 +1,41 @@
 """Module for article summarization using BytePlus LLM API."""
 
 import os
-import requests
+import re
+import json
+import logging
 from dotenv import load_dotenv
 
+from http_client import REQUEST_TIMEOUT, build_chat_body_prefix, create_session, encode_chat_body, warm_up
+from prompt_generator import VISUAL_STYLE_GUIDE
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Static system prompt shared by every request so providers can reuse its cached
+# prefix; the article text is sent on its own as the user message.
+SUMMARY_INSTRUCTION = (
+    "You are an expert in summarizing news article and generating article title. "
+    "The user message is the full news article text. "
+    "Return title and summary of article in maximum 3 bullet points. "
+    "For the title and for each bullet point also write a visual prompt for generating an image: "
+    "a visual description focusing on key visual elements only, "
+    "under 150 characters and as one complete sentence, "
+    "with no single or double quotes in the text. "
+    "Respond with JSON only, in this format: "
+    '{"title": "...", "title_visual_prompt": "...", '
+    '"bullets": [{"text": "...", "visual_prompt": "..."}]}. '
+    "Apply the following style guide to every visual prompt. "
+    + VISUAL_STYLE_GUIDE
+)
+
+# Fallback parsing of plain text summaries, e.g. 'Title: "..."' followed by "- ..." bullets,
+# skipping horizontal rules such as "---"
+_TITLE_RE = re.compile(r'^[^:\n]*Title:[ \t]*"?(.*?)"?[ \t]*$', re.M)
+_BULLET_RE = re.compile(r'^[ \t]*[-*•](?![^:\n]*Title:)(?![-*_ \t]*$)[ \t]*(\S.*?)[ \t]*$', re.M)
+
 class ArticleSummarizer:
     """Class to handle article summarization using BytePlus LLM API."""
     
@@ -18,10 +47,34 @@ class ArticleSummarizer:
         
         if not all([self.api_key, self.api_endpoint, self.model_id]):
             raise ValueError("Missing required environment variables for LLM API")
+        
+        # Reuse pooled connections across API calls
+        self.session = create_session()
+        warm_up(self.session, self.api_endpoint)
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        self._body_prefix = build_chat_body_prefix(self.model_id, SUMMARY_INSTRUCTION)
     
     def summarize_article(self, article_text):
         """Summarize the given article text using BytePlus LLM API.
         
+        Args:
+            article_text (str): The news article text to summarize.
+            
+        Returns:
+            tuple: The generated title and a list of bullet points summarizing the article.
+            
+        Raises:
+            Exception: If the API request fails.
+        """
+        summary = self._request_summary(article_text)
+        return summary["title"], [bullet["text"] for bullet in summary["bullets"]]
+    
+    def summarize_bullets_only(self, article_text):
+        """Summarize the given article text into bullet points only.
+        
         Args:
             article_text (str): The news article text to summarize.
             
@@ -31,64 +84,115 @@ class ArticleSummarizer:
         Raises:
             Exception: If the API request fails.
         """
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        return self.summarize_article(article_text)[1]
+    
+    def summarize_article_with_prompts(self, article_text):
+        """Summarize the article and generate image prompts in a single LLM call.
+        
+        Args:
+            article_text (str): The news article text to summarize.
+            
+        Returns:
+            tuple: The generated title, a list of bullet points, and a dict mapping
+                the title and each bullet point to its visual prompt.
+            
+        Raises:
+            Exception: If the API request fails.
+        """
+        summary = self._request_summary(article_text)
+        bullet_points = [bullet["text"] for bullet in summary["bullets"]]
         
-        payload = {
-            "model": self.model_id,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are an expert in summarizing news article and generating article title. Return title and summary of article in maximum 3 bullet points."
-                },
-                {
-                    "role": "user",
-                    "content": article_text
-                }
-            ]
+        visual_prompts = {
+            bullet["text"]: bullet["visual_prompt"]
+            for bullet in summary["bullets"]
+            if bullet["visual_prompt"]
         }
+        if summary["title_visual_prompt"]:
+            visual_prompts[summary["title"]] = summary["title_visual_prompt"]
         
+        return summary["title"], bullet_points, visual_prompts
+    
+    def _request_summary(self, article_text):
+        """Request the title, bullet points and visual prompts for an article.
+        
+        Args:
+            article_text (str): The news article text to summarize.
+            
+        Returns:
+            dict: Summary with "title", "title_visual_prompt" and "bullets" keys,
+                where each bullet has "text" and "visual_prompt" keys.
+            
+        Raises:
+            Exception: If the API request fails.
+        """
         try:
-            response = requests.post(self.api_endpoint, headers=headers, json=payload)
+            body = encode_chat_body(self._body_prefix, article_text)
+            response = self.session.post(self.api_endpoint, headers=self.headers, data=body, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             
             result = response.json()
-            print("\n Summarizer.pay LLM API Response:")
-            print("==================")
-            print(result)
-            print("==================\n")
+            logger.debug("LLM API response: %s", result)
             
             summary_text = result["choices"][0]["message"]["content"]
-            print("Extracted Content:")
-            print("==================")
-            print(summary_text)
-            print("==================\n")
-            
-            # Split the response into lines
-            lines = summary_text.split('\n')
-            
-            # Extract title and bullet points
-            title = ""
-            bullet_points = []
-            
-            for line in lines:
-                line = line.strip()
-                if 'Title:' in line:
-                    title = line.replace('**Title:', '').replace('**', '').strip().strip('"')
-                elif line.startswith('-'):
-                    bullet_points.append(line.lstrip('-').strip().replace('**', '').strip())
-            
-            print("Processed Output:")
-            print("==================")
-            print(f"Title: {title}")
-            print("Bullet Points:")
-            for point in bullet_points:
-                print(f"- {point}")
-            print("Summarizer.py End ==================\n")
-            
-            return title, bullet_points
+            logger.debug("Extracted content: %s", summary_text)
+            
+            try:
+                summary = self._parse_json_summary(summary_text)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # The model did not follow the JSON format, fall back to the plain text layout
+                summary = self._parse_text_summary(summary_text)
+            
+            logger.debug("Processed summary: %s", summary)
+            
+            return summary
             
         except Exception as e:
-            raise Exception(f"Failed to summarize article: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to summarize article: {str(e)}")
+    
+    @staticmethod
+    def _parse_json_summary(summary_text):
+        """Parse the JSON summary returned by the LLM.
+        
+        Args:
+            summary_text (str): The LLM response, optionally wrapped in a code fence.
+            
+        Returns:
+            dict: Summary with "title", "title_visual_prompt" and "bullets" keys.
+        """
+        # Drop any code fence or commentary around the JSON object
+        start = summary_text.find("{")
+        end = summary_text.rfind("}") + 1
+        data = json.loads(summary_text[start:end])
+        
+        bullets = []
+        for bullet in data["bullets"]:
+            if isinstance(bullet, str):
+                bullet = {"text": bullet}
+            text = bullet["text"].strip()
+            if text:
+                bullets.append({"text": text, "visual_prompt": (bullet.get("visual_prompt") or "").strip()})
+        
+        return {
+            "title": data["title"].strip(),
+            "title_visual_prompt": (data.get("title_visual_prompt") or "").strip(),
+            "bullets": bullets
+        }
+    
+    @staticmethod
+    def _parse_text_summary(summary_text):
+        """Parse a plain text summary with a "Title:" line and "-" bullet points.
+        
+        Args:
+            summary_text (str): The LLM response.
+            
+        Returns:
+            dict: Summary with "title", "title_visual_prompt" and "bullets" keys.
+        """
+        # Drop bold markers first so the patterns only have to handle plain lines
+        summary_text = summary_text.replace('**', '')
+        
+        title_match = _TITLE_RE.search(summary_text)
+        title = title_match[1] if title_match else ""
+        bullets = [{"text": text, "visual_prompt": ""} for text in _BULLET_RE.findall(summary_text)]
+        
+        return {"title": title, "title_visual_prompt": "", "bullets": bullets}
\ No newline at end of file
@@ -1,33 +1,31 @@
 import os
+import html
+import hashlib
+import logging
+import time
+import asyncio
 import streamlit as st
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 
 from webstory_generator import WebstoryGenerator
 from webstory_storage import WebstoryStorage
 from summarizer import ArticleSummarizer
-
-# Load environment variables
-load_dotenv()
-
-# Add import at the top
 from prompt_generator import PromptGenerator
+from llm_cache import get_default_cache
+from http_client import configure_logging
+from async_clients import AsyncWebstoryGenerator, BackgroundLoop
 
 # Load environment variables
 load_dotenv()
 
-def generate_webstory_html(title, images):
-    """Generate HTML for the webstory using AMP story format.
-    
-    Args:
-        title (str): The title of the webstory.
-        images (list): List of image data dictionaries.
-        
-    Returns:
-        str: HTML content for the webstory.
-    """
-    html = f'''<!DOCTYPE html>
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Document head and story opening tag, filled in with the webstory title
+_AMP_HEADER = '''<!DOCTYPE html>
     <html amp lang="en">
     <head>
         <meta charset="utf-8">
@@ -47,11 +45,11 @@ def generate_webstory_html(title, images):
         <amp-story standalone title="{title}">
 '''
 
-    # Add cover page
-    html += f'''
+# Cover page template, filled in with the title slide image and the title
+_COVER_TPL = '''
             <amp-story-page id="cover">
                 <amp-story-grid-layer template="fill">
-                    <amp-img src="{images[0]['image_url']}" width="720" height="1280" layout="responsive"></amp-img>
+                    <amp-img src="{url}" width="720" height="1280" layout="responsive"></amp-img>
                 </amp-story-grid-layer>
                 <amp-story-grid-layer template="vertical" class="text-center">
                     <div class="story-card">
@@ -61,39 +59,176 @@ def generate_webstory_html(title, images):
             </amp-story-page>
     '''
 
-    # Add story pages
-    for i, img_data in enumerate(images[1:], 1):
-        html += f'''
+# Story page template, filled in once per bullet point slide
+_PAGE_TPL = '''
             <amp-story-page id="page{i}">
                 <amp-story-grid-layer template="fill">
-                    <amp-img src="{img_data['image_url']}" width="720" height="1280" layout="responsive"></amp-img>
+                    <amp-img src="{url}" width="720" height="1280" layout="responsive"></amp-img>
                 </amp-story-grid-layer>
                 <amp-story-grid-layer template="vertical" class="text-center">
                     <div class="story-card">
-                        <p>{img_data['text']}</p>
+                        <p>{text}</p>
                     </div>
                 </amp-story-grid-layer>
             </amp-story-page>
         '''
 
-    # Close the story
-    html += '''
+# Closing tags of the story and document
+_FOOTER = '''
         </amp-story>
     </body>
     </html>
     '''
+
+def generate_webstory_html(title, images):
+    """Generate HTML for the webstory using AMP story format.
+    
+    Args:
+        title (str): The title of the webstory.
+        images (list): List of image data dictionaries.
+        
+    Returns:
+        str: HTML content for the webstory.
+    """
+    # Text and URLs are escaped so they cannot break out of the markup
+    escaped_title = html.escape(title)
+    parts = [
+        _AMP_HEADER.format(title=escaped_title),
+        _COVER_TPL.format(url=html.escape(images[0]['image_url']), title=escaped_title)
+    ]
+
+    # Add story pages
+    for i, img_data in enumerate(images[1:], 1):
+        parts.append(_PAGE_TPL.format(i=i, url=html.escape(img_data['image_url']), text=html.escape(img_data['text'])))
+
+    # Close the story
+    parts.append(_FOOTER)
+    
+    return "".join(parts)
+
+# Strong references to the preview downloads still running on the background loop
+pending_downloads = set()
+
+async def process_webstory(background_loop, title, points, visual_prompts, slides, image_bytes):
+    """Generate the images for all webstory slides concurrently.
+    
+    Args:
+        background_loop (BackgroundLoop): Provides the session and image concurrency limit.
+        title (str): The webstory title.
+        points (list): The webstory bullet points.
+        visual_prompts (dict): Prompts already generated with the article summary, keyed by text.
+        slides (list): One Future per slide, title first, resolved with its image URL as soon as it is ready.
+        image_bytes (dict): Filled with the downloaded content of each image, keyed by URL.
+        
+    Returns:
+        list: Image URLs for the title followed by one per bullet point.
+    """
+    session = background_loop.session
+    images = AsyncWebstoryGenerator(webstory_generator, session, background_loop.image_semaphore)
+    
+    async def get_title_prompt():
+        return visual_prompts.get(title.strip()) or await prompt_generator.aenhance_title_prompt(session, title)
+    
+    async def get_point_prompts():
+        # Bullets without a prompt from the summary are enhanced together in one request,
+        # repeated bullets only once
+        missing = list(dict.fromkeys(point for point in points if not visual_prompts.get(point.strip())))
+        enhanced = dict(zip(missing, await prompt_generator.aenhance_bullets_batch(session, missing))) if missing else {}
+        return [visual_prompts.get(point.strip()) or enhanced[point] for point in points]
+    
+    title_prompt, point_prompts = await asyncio.gather(get_title_prompt(), get_point_prompts())
+    
+    # Slides with identical prompts share a single generated image
+    items = [(title_prompt, "title")] + [(prompt, "webstory") for prompt in point_prompts]
+    unique_items = list(dict.fromkeys(items))
+    item_slides = {}
+    for slide, item in zip(slides, items):
+        item_slides.setdefault(item, []).append(slide)
+    
+    # Download each image once while the others are still generated, so the
+    # preview does not fetch it again on every rerun. The downloads keep running
+    # on the background loop after the webstory is saved, so a slow image CDN
+    # does not delay it
+    
+    async def download(image_url):
+        try:
+            image_bytes[image_url] = await images.download_image(image_url)
+        except Exception as e:
+            logger.warning("Failed to download %s, the preview will load it from the URL: %s", image_url, e)
+    
+    def slide_ready(index, image_url):
+        task = asyncio.ensure_future(download(image_url))
+        pending_downloads.add(task)
+        task.add_done_callback(pending_downloads.discard)
+        for slide in item_slides[unique_items[index]]:
+            slide.set_result(image_url)
+    
+    url_map = dict(zip(unique_items, await images.generate_webstory_images(unique_items, on_ready=slide_ready)))
+    return [url_map[item] for item in items]
+
+def build_webstory(title, points, visual_prompts, slides, image_bytes):
+    """Generate the slide images and save the webstory, for running in the background.
+    
+    Args:
+        title (str): The webstory title.
+        points (list): The webstory bullet points.
+        visual_prompts (dict): Prompts already generated with the article summary, keyed by text.
+        slides (list): One Future per slide, resolved as each image is ready.
+        image_bytes (dict): Filled with the downloaded content of each image, keyed by URL.
+        
+    Returns:
+        dict: The slide "images" and the webstory "html_url" and "download_url".
+    """
+    image_urls = background_loop.run(
+        process_webstory(background_loop, title, points, visual_prompts, slides, image_bytes)
+    )
+    images = [
+        {"image_url": image_url, "text": text}
+        for text, image_url in zip([title] + points, image_urls)
+    ]
     
-    return html
+    # Generate and save HTML content
+    html_content = generate_webstory_html(title, images)
+    html_url, download_url = webstory_storage.save_webstory(html_content, title)
+    return {"images": images, "html_url": html_url, "download_url": download_url}
 
-# Initialize components
-webstory_generator = WebstoryGenerator()
-webstory_storage = WebstoryStorage()
-summarizer = ArticleSummarizer()
-prompt_generator = PromptGenerator()
+@st.cache_resource
+def get_executor():
+    """Thread pool shared by all sessions for background webstory generation."""
+    return ThreadPoolExecutor(max_workers=4)
 
-# Set up the Streamlit page
+# Set up the Streamlit page first, the cached components below may show a spinner
 st.set_page_config(page_title="News Webstory Generator", layout="wide")
 
+# Initialize components once per process so their pooled connections
+# survive reruns and their warm-up runs at startup rather than on every rerun
+@st.cache_resource
+def get_webstory_generator():
+    return WebstoryGenerator()
+
+@st.cache_resource
+def get_background_loop():
+    """Event loop and aiohttp session shared by all background webstory generations."""
+    return BackgroundLoop(warm_up_urls=(webstory_generator.api_endpoint, prompt_generator.api_endpoint))
+
+@st.cache_resource
+def get_webstory_storage():
+    return WebstoryStorage()
+
+@st.cache_resource
+def get_summarizer():
+    return ArticleSummarizer()
+
+@st.cache_resource
+def get_prompt_generator():
+    return PromptGenerator()
+
+webstory_generator = get_webstory_generator()
+webstory_storage = get_webstory_storage()
+summarizer = get_summarizer()
+prompt_generator = get_prompt_generator()
+background_loop = get_background_loop()
+
 # Instructions in the sidebar - MOVE THIS SECTION HERE
 with st.sidebar:
     st.header("How to use")
@@ -137,6 +272,9 @@ if "webstory_html_url" not in st.session_state:
 if "current_image_index" not in st.session_state:
     st.session_state.current_image_index = 0
 
+if "webstory_image_bytes" not in st.session_state:
+    st.session_state.webstory_image_bytes = {}
+
 # Section 1: Article Summary Generation
 st.header("1. Article Summary Generation")
 col1, col2 = st.columns([1, 1])  # Adjust column widths to be equal
@@ -154,8 +292,9 @@ with col1:
     if st.button("Generate Summary", key="generate_summary_btn"):
         if article_text.strip():
             with st.spinner("Generating summary..."):
-                # Generate summary points using the summarizer
-                title, summary_points = summarizer.summarize_article(article_text)
+                # Generate summary points and their image prompts in a single call
+                title, summary_points, visual_prompts = summarizer.summarize_article_with_prompts(article_text)
+                st.session_state.visual_prompts = visual_prompts
                 # Update the bullet points text area and article title
                 st.session_state.bullet_points = "\n".join(summary_points)
                 st.session_state.article_title = title  # Add this line to store the title
@@ -205,45 +344,75 @@ webstory_points = st.text_area(
     key="webstory_points"
 )
 
+# One slide per non-blank line, splitlines also handles pasted \r\n line endings
+points = [point for point in map(str.strip, webstory_points.splitlines()) if point]
+
 # Generate webstory button
 if st.button("Generate Webstory", key="generate_webstory_btn"):
-    try:
-        with st.spinner("Generating webstory..."):
-            # Clear previous images
-            st.session_state.webstory_images = []
-            
-            # Generate enhanced title prompt and title image
-            enhanced_title_prompt = prompt_generator.enhance_title_prompt(webstory_title)
-            title_image_url = webstory_generator.generate_webstory_image(
-                enhanced_title_prompt,
-                style="title"
-            )
-            st.session_state.webstory_images.append({
-                "image_url": title_image_url,
-                "text": webstory_title
-            })
-            
-            # Generate images for each bullet point
-            for point in webstory_points.strip().split("\n"):
-                if point.strip():
-                    enhanced_bullet_prompt = prompt_generator.enhance_bullet_prompt(point)
-                    image_url = webstory_generator.generate_webstory_image(enhanced_bullet_prompt)
-                    st.session_state.webstory_images.append({
-                        "image_url": image_url,
-                        "text": point
-                    })
-            
-            # Generate and save HTML content
-            html_content = generate_webstory_html(webstory_title, st.session_state.webstory_images)
-            st.session_state.webstory_html_url, st.session_state.webstory_download_url = webstory_storage.save_webstory(
-                html_content,
-                webstory_title
-            )
+    # The same title and bullet points are only generated once, a repeated
+    # click keeps the webstory that is already generated or in progress
+    webstory_hash = hashlib.blake2b(
+        "\x00".join([webstory_title] + points).encode('utf-8'),
+        digest_size=8
+    ).hexdigest()
+    if webstory_hash == st.session_state.get("webstory_hash"):
+        st.info("This webstory has already been generated")
+    else:
+        st.session_state.webstory_hash = webstory_hash
+        
+        # Clear previous images
+        st.session_state.webstory_images = []
+        st.session_state.webstory_html_url = ""
+        
+        # Slides left unedited since the summary reuse its visual prompts,
+        # any other slide gets its prompt enhanced first
+        visual_prompts = st.session_state.get("visual_prompts", {})
+        
+        # Generate in the background so the page stays responsive, slides are
+        # previewed one by one as their images become ready
+        st.session_state.webstory_slide_texts = [webstory_title] + points
+        st.session_state.webstory_slides = [Future() for _ in st.session_state.webstory_slide_texts]
+        st.session_state.webstory_image_bytes = {}
+        st.session_state.current_image_index = 0
+        st.session_state.webstory_future = get_executor().submit(
+            build_webstory,
+            webstory_title,
+            points,
+            visual_prompts,
+            st.session_state.webstory_slides,
+            st.session_state.webstory_image_bytes
+        )
+
+# Poll the background generation on every rerun until it finishes
+webstory_future = st.session_state.get("webstory_future")
+if webstory_future is not None:
+    if webstory_future.done():
+        st.session_state.webstory_future = None
+        try:
+            webstory = webstory_future.result()
+            st.session_state.webstory_images = webstory["images"]
+            st.session_state.webstory_html_url = webstory["html_url"]
+            st.session_state.webstory_download_url = webstory["download_url"]
             
             st.success("Webstory generated successfully!")
             
-    except Exception as e:
-        st.error(f"Error generating webstory: {str(e)}")
+        except Exception as e:
+            # Allow retrying the same webstory after a failure
+            st.session_state.webstory_hash = None
+            st.error(f"Error generating webstory: {str(e)}")
+    else:
+        # Preview every slide in story order, with no image yet for the pending ones
+        # so the slide being viewed stays in place as the others complete
+        slides = st.session_state.webstory_slides
+        st.session_state.webstory_images = [
+            {"image_url": slide.result() if slide.done() and slide.exception() is None else None, "text": text}
+            for text, slide in zip(st.session_state.webstory_slide_texts, slides)
+        ]
+        completed = sum(slide.done() for slide in slides)
+        st.progress(
+            completed / len(slides),
+            text=f"Generating webstory... {completed} of {len(slides)} slides ready"
+        )
 
 # Display generated webstory if available
 if st.session_state.webstory_images:
@@ -255,20 +424,22 @@ if st.session_state.webstory_images:
     with col1:
         if st.button("Previous") and st.session_state.current_image_index > 0:
             st.session_state.current_image_index -= 1
-            st.experimental_rerun()
     
     with col3:
         if st.button("Next") and st.session_state.current_image_index < len(st.session_state.webstory_images) - 1:
             st.session_state.current_image_index += 1
-            st.experimental_rerun()
     
     # Display current image
     current_image = st.session_state.webstory_images[st.session_state.current_image_index]
-    st.image(
-        current_image["image_url"],
-        caption=current_image["text"],
-        use_container_width=True  # Updated from use_column_width
-    )
+    if current_image["image_url"] is None:
+        st.info(f"Generating the image for: {current_image['text']}")
+    else:
+        # Show the downloaded image, or let the browser load it while it is not downloaded yet
+        st.image(
+            st.session_state.webstory_image_bytes.get(current_image["image_url"], current_image["image_url"]),
+            caption=current_image["text"],
+            use_container_width=True  # Updated from use_column_width
+        )
     
     # Display progress
     st.markdown(
@@ -282,4 +453,15 @@ if st.session_state.webstory_images:
         with col1:
             st.markdown(f"[🌐 View Full Webstory]({st.session_state.webstory_html_url})")
         with col2:
-            st.markdown(f"[⬇️ Download HTML]({st.session_state.webstory_download_url})")
\ No newline at end of file
+            st.markdown(f"[⬇️ Download HTML]({st.session_state.webstory_download_url})")
+
+# Cache statistics go last in the sidebar so they include this run's API calls
+with st.sidebar:
+    st.header("Response Cache")
+    response_cache = get_default_cache()
+    st.markdown(f"Hits: {response_cache.hits} | Misses: {response_cache.misses}")
+
+# Keep polling while the webstory is generated, after the page has rendered
+if st.session_state.get("webstory_future") is not None:
+    time.sleep(0.5)
+    st.rerun()
\ No newline at end of file
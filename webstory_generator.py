@@ -1,18 +1,46 @@
 import os
-import time
-import random
-import hashlib
-import requests
+import re
+import asyncio
+import logging
+import orjson
+import aiohttp
 from dotenv import load_dotenv
 
+from http_client import IMAGE_REQUEST_TIMEOUT, RETRY_STATUSES, create_session, create_signer, signed_params
+from llm_cache import IMAGE_URL_TTL, get_default_cache
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Markdown left in LLM output: everything up to a "**Visual prompt:**" label, and emphasis
+_CLEAN_RE = re.compile(r'^.*?\*\*Visual prompt:\*\*|\*+', re.S)
+# Whitespace and quotes surrounding the prompt
+_QUOTE_RE = re.compile(r'''^[\s'"]+|[\s'"]+$''')
+
+# IMAGE_REQUEST_TIMEOUT for the asyncio requests, which otherwise get the session's LLM timeouts
+_ASYNC_IMAGE_TIMEOUT = aiohttp.ClientTimeout(sock_connect=IMAGE_REQUEST_TIMEOUT[0], sock_read=IMAGE_REQUEST_TIMEOUT[1])
+
+# Prompt length limit of the text-to-image API, in UTF-8 bytes
+MAX_PROMPT_BYTES = 400
+
+def _truncate_utf8(text, max_bytes):
+    """Truncate text to at most max_bytes UTF-8 bytes without splitting a character."""
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode('utf-8', errors='ignore')
+
 class WebstoryGenerator:
     """Class to handle webstory image generation using BytePlus text-to-image API."""
     
-    def __init__(self):
-        """Initialize the generator with API details from environment variables."""
+    def __init__(self, cache=None):
+        """Initialize the generator with API details from environment variables.
+        
+        Args:
+            cache (LLMCache): Response cache, defaults to the shared cache.
+        """
         self.api_key = os.getenv("CV_API_KEY")
         self.api_secret = os.getenv("CV_API_SECRET")
         self.api_endpoint = os.getenv("CV_API_ENDPOINT")
@@ -20,68 +48,17 @@ class WebstoryGenerator:
         
         if not all([self.api_key, self.api_secret, self.api_endpoint, self.req_key]):
             raise ValueError("Missing required environment variables for text-to-image API")
-    
-    def _generate_signature(self, nonce, timestamp):
-        """Generate signature for API authentication."""
-        keys = [str(nonce), self.api_secret, str(timestamp)]
-        keys.sort()
-        key_str = ''.join(keys).encode('utf-8')
-        signature = hashlib.sha1(key_str).hexdigest()
-        return signature.lower()
-    
-    def generate_webstory_image(self, text, style="webstory"):
-        """Generate a webstory image based on the provided text.
         
-        Args:
-            text (str): The text to generate an image for (title or bullet point).
-            style (str): The style of image to generate ("webstory" or "title").
-            
-        Returns:
-            str: URL of the generated image.
-        """
-        timestamp = int(time.time())
-        nonce = random.randint(0, (1 << 31) - 1)
-        
-        # Parameters for signature
-        req_params = {
-            "api_key": self.api_key,
-            "timestamp": str(timestamp),
-            "nonce": str(nonce),
-            "sign": self._generate_signature(nonce, timestamp)
-        }
-        
-        # Request headers
-        req_headers = {
+        # Reuse pooled connections across API calls
+        self.session = create_session()
+        self._sign = create_signer(self.api_secret)
+        self.headers = {
             "Content-Type": "application/json"
         }
         
-        # Clean input text by removing markdown and special formatting
-        cleaned_text = text
-        # Remove Visual prompt prefix
-        if "**Visual prompt:**" in cleaned_text:
-            cleaned_text = cleaned_text.split("**Visual prompt:**", 1)[1].strip()
-        # Remove any remaining markdown formatting
-        cleaned_text = cleaned_text.replace("**", "").replace("*", "").strip()
-        # Remove any surrounding quotes
-        cleaned_text = cleaned_text.strip('"').strip("'")  # Remove both single and double quotes
-        
-        # Adjust prompt based on style
-        if style == "title":
-            prompt = cleaned_text
-            print(f"\n VLM Generating Title Image:\nStyle: {style}\nInput Text: {cleaned_text}\nPrompt: {prompt}\n")
-        else:
-            prompt = cleaned_text
-            print(f"\n VLM Generating Story Image:\nStyle: {style}\nInput Text: {cleaned_text}\nPrompt: {prompt}\n")
-        
-        # Clean and truncate the prompt
-        prompt = prompt.strip()
-        if len(prompt) > 200:
-            prompt = prompt[:200]
-        
-        # Request body
-        req_body = {
+        # Static part of the request body, only the prompt changes per call
+        self._body_template = {
             "req_key": self.req_key,
-            "prompt": prompt,
             "return_url": True,
             "scale" : 7.0,
             "logo_info": {
@@ -94,30 +71,242 @@ class WebstoryGenerator:
                 "logo_text_content": "@BytePlus 2025"
             }
         }
+        self.cache = cache or get_default_cache()
+        # Batch requests with a "prompts" array are only sent when enabled, since the
+        # API is not documented to accept them; cleared once the API rejects one
+        self.batch_supported = os.getenv("CV_BATCH_PROMPTS_ENABLED", "").lower() in ("1", "true", "yes")
+    
+    def generate_webstory_image(self, text, style="webstory"):
+        """Generate a webstory image based on the provided text.
+        
+        Args:
+            text (str): The text to generate an image for (title or bullet point).
+            style (str): The style of image to generate ("webstory" or "title").
+            
+        Returns:
+            str: URL of the generated image.
+        """
+        req_params, req_headers, req_body = self._build_request(text, style)
+        
+        # Regenerating the same webstory reuses the images of identical prompts
+        cache_key = self._cache_key(req_body["prompt"])
+        cached_url = self.cache.get(cache_key, ttl=IMAGE_URL_TTL)
+        if cached_url is not None:
+            return cached_url
         
         try:
-            print(f"\nSending API request with parameters:\n{req_params}\n")
-            print(f"Request body:\n{req_body}\n")
+            # The query parameters carry the signature, so only the body is logged
+            logger.debug("Sending API request with body: %s", req_body)
             
-            response = requests.post(
+            response = self.session.post(
                 self.api_endpoint,
                 params=req_params,
                 headers=req_headers,
-                json=req_body
+                data=orjson.dumps(req_body),
+                timeout=IMAGE_REQUEST_TIMEOUT
             )
             
             if response.status_code != 200:
-                print(f"API Error Response:\n{response.text}\n")
                 raise Exception(f"API request failed with status {response.status_code}: {response.text}")
             
-            result = response.json()
-            print(f"API Response:\n{result}\n")
+            image_url = self._parse_response(orjson.loads(response.content))
+            self.cache.set(cache_key, image_url)
+            return image_url
             
-            if result["code"] != 10000 or not result["data"]["image_urls"]:
-                raise Exception(f"API error: {result.get('message', 'Unknown error')}")
+        except Exception as e:
+            raise Exception(f"Failed to generate webstory image: {str(e)}")
+    
+    async def agenerate_webstory_image(self, session, text, style="webstory"):
+        """Generate a webstory image based on the provided text, asynchronously.
+        
+        Args:
+            session (aiohttp.ClientSession): Session used for the request.
+            text (str): The text to generate an image for (title or bullet point).
+            style (str): The style of image to generate ("webstory" or "title").
             
-            return result["data"]["image_urls"][0]
+        Returns:
+            str: URL of the generated image.
+        """
+        req_params, req_headers, req_body = self._build_request(text, style)
+        
+        cache_key = self._cache_key(req_body["prompt"])
+        cached_url = await asyncio.to_thread(self.cache.get, cache_key, ttl=IMAGE_URL_TTL)
+        if cached_url is not None:
+            return cached_url
+        
+        try:
+            async with session.post(
+                self.api_endpoint,
+                params=req_params,
+                headers=req_headers,
+                data=orjson.dumps(req_body),
+                timeout=_ASYNC_IMAGE_TIMEOUT
+            ) as response:
+                if response.status != 200:
+                    response_text = await response.text()
+                    raise Exception(f"API request failed with status {response.status}: {response_text}")
+                result = orjson.loads(await response.read())
+            
+            image_url = self._parse_response(result)
+            await asyncio.to_thread(self.cache.set, cache_key, image_url)
+            return image_url
             
         except Exception as e:
-            print(f"Error details: {str(e)}")
-            raise Exception(f"Failed to generate webstory image: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Failed to generate webstory image: {str(e)}")
+    
+    async def agenerate_webstory_images(self, session, items):
+        """Generate the images of several slides with a single API request, asynchronously.
+        
+        Slides whose images are cached are not requested again. This does not
+        fall back to one request per slide, so the caller can run those with
+        its own concurrency limit.
+        
+        Args:
+            session (aiohttp.ClientSession): Session used for the request.
+            items (list): (text, style) tuples, one per slide.
+            
+        Returns:
+            list: URLs of the generated images in the same order as the items,
+                None for the slides neither cached nor generated by the batch request.
+        """
+        # Without batching, each slide's own request looks up its cached image
+        if not self.batch_supported or len(items) < 2:
+            return [None] * len(items)
+        
+        image_urls, pending = await asyncio.to_thread(self._lookup_batch, items)
+        if len(pending) > 1:
+            req_params, req_body = self._build_batch_request(items, pending)
+            try:
+                async with session.post(
+                    self.api_endpoint,
+                    params=req_params,
+                    headers=self.headers,
+                    data=orjson.dumps(req_body),
+                    timeout=_ASYNC_IMAGE_TIMEOUT
+                ) as response:
+                    result = orjson.loads(await response.read()) if response.status == 200 else None
+                await asyncio.to_thread(
+                    self._apply_batch_response, response.status, result, req_body["prompts"], pending, image_urls
+                )
+            except Exception as e:
+                logger.warning("Batch image request failed, generating images one by one: %s", e)
+        return image_urls
+    
+    def _lookup_batch(self, items):
+        """Look up the cached images of several slides.
+        
+        Args:
+            items (list): (text, style) tuples, one per slide.
+            
+        Returns:
+            tuple: Image URLs in item order, None where not cached, and the indices of those items.
+        """
+        image_urls = [
+            self.cache.get(self._cache_key(self._clean_prompt(text)), ttl=IMAGE_URL_TTL)
+            for text, _ in items
+        ]
+        pending = [i for i, image_url in enumerate(image_urls) if image_url is None]
+        return image_urls, pending
+    
+    def _build_batch_request(self, items, pending):
+        """Build the signed query parameters and body of a batch image request.
+        
+        Args:
+            items (list): (text, style) tuples, one per slide.
+            pending (list): Indices of the items to request images for.
+            
+        Returns:
+            tuple: Query parameters and JSON body with one prompt per pending item.
+        """
+        prompts = [self._clean_prompt(items[i][0]) for i in pending]
+        logger.debug("Generating %d images in one batch", len(prompts))
+        return self._signed_params(), {**self._body_template, "prompts": prompts}
+    
+    def _apply_batch_response(self, status, result, prompts, pending, image_urls):
+        """Fill in and cache the image URLs of a batch response.
+        
+        A client error or an API error code means the API does not accept
+        batch requests, so they are not tried again. Throttled and server
+        error responses only skip batching for this call.
+        
+        Args:
+            status (int): HTTP status of the response.
+            result (dict): The decoded API response, None unless the status is 200.
+            prompts (list): The prompts that were sent.
+            pending (list): Indices of the items the prompts belong to.
+            image_urls (list): Image URLs in item order, updated in place.
+        """
+        if status in RETRY_STATUSES:
+            logger.warning("Batch image request failed with status %s, generating images one by one", status)
+            return
+        
+        if result is not None:
+            logger.debug("API response: %s", result)
+        batch_urls = (result.get("data") or {}).get("image_urls") if result and result.get("code") == 10000 else None
+        if not batch_urls or len(batch_urls) != len(prompts):
+            logger.warning("Batch image requests are not supported (status %s), disabling them", status)
+            self.batch_supported = False
+            return
+        
+        for i, prompt, image_url in zip(pending, prompts, batch_urls):
+            image_urls[i] = image_url
+            self.cache.set(self._cache_key(prompt), image_url)
+    
+    def _build_request(self, text, style):
+        """Build the signed query parameters, headers and body of an image request.
+        
+        Args:
+            text (str): The text to generate an image for (title or bullet point).
+            style (str): The style of image to generate ("webstory" or "title").
+            
+        Returns:
+            tuple: Query parameters, request headers and JSON body.
+        """
+        prompt = self._clean_prompt(text)
+        
+        # Title and story images currently use the same prompt
+        logger.debug("Generating %s image for prompt: %s", style, prompt)
+        
+        req_body = {**self._body_template, "prompt": prompt}
+        return self._signed_params(), self.headers, req_body
+    
+    def _signed_params(self):
+        """Build the query parameters authenticating a request.
+        
+        Returns:
+            dict: API key, timestamp, nonce and signature.
+        """
+        return signed_params(self.api_key, self._sign)
+    
+    def _cache_key(self, prompt):
+        """Build the response cache key of a single image request for a prompt."""
+        return self.cache.make_key({**self._body_template, "prompt": prompt}, self.req_key)
+    
+    @staticmethod
+    def _clean_prompt(text):
+        """Turn a title, bullet point or enhanced prompt into an image prompt.
+        
+        Args:
+            text (str): The text to generate an image for.
+            
+        Returns:
+            str: The text without markdown and surrounding quotes, truncated to the API's byte limit.
+        """
+        return _truncate_utf8(_QUOTE_RE.sub('', _CLEAN_RE.sub('', text)), MAX_PROMPT_BYTES)
+    
+    @staticmethod
+    def _parse_response(result):
+        """Extract the image URL from a text-to-image API response.
+        
+        Args:
+            result (dict): The decoded API response.
+            
+        Returns:
+            str: URL of the generated image.
+        """
+        logger.debug("API response: %s", result)
+        
+        if result["code"] != 10000 or not result["data"]["image_urls"]:
+            raise Exception(f"API error: {result.get('message', 'Unknown error')}")
+        
+        return result["data"]["image_urls"][0]
\ No newline at end of file
@@ -1,10 +1,11 @@
 import os
 import json
-import tempfile
 from datetime import datetime
 import tos
 from dotenv import load_dotenv
 
+from storage import object_key_title
+
 # Load environment variables
 load_dotenv()
 
@@ -68,31 +69,20 @@ class WebstoryStorage:
         try:
             # Generate a unique object key
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            clean_title = ''.join(c if c.isalnum() else '_' for c in title)[:50]
+            clean_title = object_key_title(title)
             object_key = f"{self.object_key_prefix}/{timestamp}_{clean_title}.html"
             
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix=".html") as temp_file:
-                temp_file_path = temp_file.name
-                temp_file.write(html_content)
+            # Upload the HTML straight from memory to BytePlus Object Storage
+            self.client.put_object(
+                self.bucket_name,
+                object_key,
+                content=html_content.encode('utf-8')
+            )
             
-            try:
-                # Upload to BytePlus Object Storage
-                self.client.put_object_from_file(
-                    self.bucket_name,
-                    object_key,
-                    temp_file_path
-                )
-                
-                # Generate URL for the uploaded webstory
-                storage_url = f"https://{self.bucket_name}.{self.endpoint}/{object_key}"
-                download_url = self.get_download_url(object_key)
-                return storage_url, download_url
-                
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            # Generate URL for the uploaded webstory
+            storage_url = f"https://{self.bucket_name}.{self.endpoint}/{object_key}"
+            download_url = self.get_download_url(object_key)
+            return storage_url, download_url
                     
         except Exception as e:
             raise Exception(f"Failed to save webstory: {str(e)}")
\ No newline at end of file